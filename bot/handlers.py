@@ -11,16 +11,16 @@ from telegram.ext import CommandHandler, Filters, MessageHandler
 from utils.calculate_attempts import (
     connections_attempts,
     mini_time,
-    mini_time_app,
     wordle_attempts,
 )
-from utils.helpers import add_game, add_manual_score, clear_scoreboard, show_scoreboard
-from utils.patterns import (
-    connections_pattern,
-    mini_pattern,
-    mini_pattern_app,
-    wordle_pattern,
+from utils.helpers import (
+    add_game,
+    add_manual_score,
+    clear_scoreboard,
+    show_scoreboard,
+    today_date,
 )
+from utils.patterns import game_keywords, game_pattern
 
 
 def handle_messages(update: Update, context):
@@ -39,22 +39,36 @@ def handle_messages(update: Update, context):
     message = update.message.text
     user = update.message.from_user.first_name
 
-    # Check if the message matches any pattern
-    if connections_pattern.search(message):
+    # Skip the regex engine for messages that can't be a game result (most of the chat)
+    if not any(keyword in message for keyword in game_keywords):
+        return
+
+    # Check if the message matches any pattern, in a single scan
+    match = game_pattern.search(message)
+    if not match:
+        return
+    today = today_date()
+
+    if match.lastgroup == "connections":
         attempts = connections_attempts(message)
-        add_game(user, "Connections", attempts, context, update)
-    elif mini_pattern.search(message):
-        time = mini_time(message)
-        add_game(user, "Mini", time, context, update)
-    elif mini_pattern_app.search(message):
-        time = mini_time_app(message)
-        add_game(user, "Mini", time, context, update)
-    elif wordle_pattern.search(message):
-        attempts = wordle_attempts(message)
-        add_game(user, "Wordle", attempts, context, update)
-
-
-message_handler = MessageHandler(Filters.text & ~Filters.command, handle_messages)
-scoreboard_handler = CommandHandler("scoreboard", show_scoreboard)
-clear_handler = CommandHandler("clear", clear_scoreboard, pass_args=True)
-add_handler = CommandHandler("add", add_manual_score, pass_args=True)
+        if attempts is None:
+            return
+        add_game(user, "Connections", attempts, today, context, update)
+    elif match.lastgroup in ("mini", "mini_app"):
+        time = mini_time(match)
+        add_game(user, "Mini", time, today, context, update)
+    elif match.lastgroup == "wordle":
+        attempts = wordle_attempts(match)
+        add_game(user, "Wordle", attempts, today, context, update)
+
+
+# Handlers run asynchronously on the dispatcher's worker pool, so a slow update
+# (database or Telegram round trips) does not hold up updates from other chats
+message_handler = MessageHandler(
+    Filters.text & ~Filters.command, handle_messages, run_async=True
+)
+scoreboard_handler = CommandHandler("scoreboard", show_scoreboard, run_async=True)
+clear_handler = CommandHandler(
+    "clear", clear_scoreboard, pass_args=True, run_async=True
+)
+add_handler = CommandHandler("add", add_manual_score, pass_args=True, run_async=True)
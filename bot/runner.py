@@ -19,11 +19,13 @@ def run_bot():
     """
     Initialize and run the Telegram Bot.
 
-    Creates an Updater instance with the provided Telegram Bot token,
-    registers message and command handlers, and starts polling for updates.
+    Creates an Updater instance with the provided Telegram Bot token and a pool of
+    16 worker threads, registers message and command handlers, and starts polling for updates.
     """
 
-    updater = Updater(token=os.getenv("TELEGRAM_BOT_TOKEN"), use_context=True)
+    updater = Updater(
+        token=os.getenv("TELEGRAM_BOT_TOKEN"), workers=16, use_context=True
+    )
     dispatcher = updater.dispatcher
 
     # Register message/command handlers
@@ -32,6 +34,7 @@ def run_bot():
     dispatcher.add_handler(clear_handler)
     dispatcher.add_handler(add_handler)
 
-    # Start the bot
-    updater.start_polling(clean=True)
+    # Start the bot, long polling: Telegram holds each getUpdates request open for
+    # up to 30 seconds until an update arrives, instead of answering empty polls
+    updater.start_polling(poll_interval=0.0, timeout=30, clean=True, read_latency=2.0)
     updater.idle()
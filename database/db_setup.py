@@ -3,18 +3,57 @@ Script to initialize the database connection and create the required table.
 
 This script uses SQLalchemy to establish a connection to a local SQLite database.
 If the database file does not exist, it creates a table named 'nyt_rankbot' with columns 'id', 'user', 'game', 'score', and 'date'.
+Connections are pooled, so that concurrent handlers each borrow their own connection.
 """
 
+import logging
 import os
 
-from sqlalchemy import Column, Date, Integer, String, create_engine
+from sqlalchemy import (
+    Column,
+    Date,
+    Index,
+    Integer,
+    String,
+    create_engine,
+    delete,
+    event,
+    func,
+    inspect,
+    select,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
 
 # Database configuration
 db_file_path = f"{os.path.join(os.getcwd(), 'database/nyt_rankbot.db')}"
 db_url = f"sqlite:///{db_file_path}"
-engine = create_engine(db_url)
+engine = create_engine(
+    db_url,
+    # Handlers run on several threads, each borrowing a pooled connection
+    connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=8,
+    max_overflow=8,
+)
+
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Configure each new SQLite connection.
+
+    WAL journaling lets reads proceed while a score is being written, and with
+    synchronous=NORMAL a commit no longer waits for an fsync of the database file.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
 
 # Declarative base
 Base = declarative_base()
@@ -30,9 +69,19 @@ class NytRankbot(Base):
     - game (str): Name of the game, not nullable.
     - score (int): Score achieved by the user in the game, not nullable.
     - date (Date): Date when the score was achieved, not nullable.
+
+    A user can only submit one score per game and date, which is enforced by a unique index.
+    Queries for a date range only read the matching entries of a covering index, so their
+    cost does not grow with the table's history.
     """
 
     __tablename__ = "nyt_rankbot"
+    __table_args__ = (
+        Index("uq_user_game_date", "user", "game", "date", unique=True),
+        # Covers the date-filtered queries, already in (date, game, score) order with
+        # tied scores in submission order
+        Index("idx_date_game_score_id", "date", "game", "score", "id", "user"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     user = Column(String(255), nullable=False)
     game = Column(String(255), nullable=False)
@@ -43,5 +92,32 @@ class NytRankbot(Base):
 # Create the table
 Base.metadata.create_all(engine)
 
-# Create a session factory
-SessionFactory = sessionmaker(bind=engine)
+# Databases from before the unique index may hold repeated (user, game, date) rows,
+# e.g. from /add; keep the first submission of each so the index can be created.
+# This only runs once, while the index is still missing.
+_table = NytRankbot.__table__
+_index_names = {index["name"] for index in inspect(engine).get_indexes(_table.name)}
+if "uq_user_game_date" not in _index_names:
+    with engine.begin() as connection:
+        removed = connection.execute(
+            delete(_table).where(
+                _table.c.id.not_in(
+                    select(func.min(_table.c.id)).group_by(
+                        _table.c.user, _table.c.game, _table.c.date
+                    )
+                )
+            )
+        ).rowcount
+    if removed:
+        logger.warning(
+            "Removed %d duplicate submissions before adding the unique index", removed
+        )
+
+# Add any missing indexes, since create_all does not alter an existing table
+for index in _table.indexes:
+    index.create(engine, checkfirst=True)
+
+# Replaced by idx_date_game_score_id, which also orders tied scores by id
+if "idx_date_game_score" in _index_names:
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX idx_date_game_score")
@@ -2,73 +2,224 @@
 Database Operations Module
 
 This module provides functions for interacting with the SQLAlchemy database, including
-adding game data, clearing the table for a specific date, and checking if a user has
-already submitted data for a specific game on the current date.
+adding game data (once per user, game and date) and clearing the table for a specific date.
+Queries run as Core statements on a pooled connection, without an ORM session.
+
+Games queued with queue_game_for_database are written in batches by a background thread;
+every other function first waits for the queued games to be written.
 """
 
-from database.db_setup import NytRankbot, SessionFactory
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from sqlalchemy import bindparam, case, delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from database.db_setup import NytRankbot, engine
+
+# Statements are built once with bound parameters, so values are never spliced into
+# the SQL text and the compiled statement is reused on every call
+_table = NytRankbot.__table__
+_today_query = (
+    select(_table.c.user, _table.c.game, _table.c.score)
+    .where(_table.c.date == bindparam("date"))
+    .order_by(_table.c.game, _table.c.score, _table.c.id)
+)
+# Points per score, ranked per date/game (ties share the best rank): 3, 2 and 1 for the top three
+_rank = func.rank().over(
+    partition_by=(_table.c.date, _table.c.game), order_by=_table.c.score
+)
+_points_query = (
+    select(
+        _table.c.user, case({1: 3, 2: 2, 3: 1}, value=_rank, else_=0).label("points")
+    )
+    .where(_table.c.date.between(bindparam("start"), bindparam("end")))
+    .subquery()
+)
+_period_totals_query = (
+    select(_points_query.c.user, func.sum(_points_query.c.points).label("points"))
+    .group_by(_points_query.c.user)
+    .order_by(func.sum(_points_query.c.points).desc())
+)
+_insert_game_statement = (
+    insert(_table)
+    .values(
+        user=bindparam("user"),
+        game=bindparam("game"),
+        score=bindparam("score"),
+        date=bindparam("date"),
+    )
+    .on_conflict_do_nothing()
+)
+_clear_date_statement = delete(_table).where(_table.c.date == bindparam("date"))
+_clear_user_statement = _clear_date_statement.where(_table.c.user == bindparam("user"))
+
+logger = logging.getLogger(__name__)
 
+# Games waiting to be written, as parameters for _insert_game_statement. A batch is
+# written (in one transaction) once it holds 32 games or its first game waited 50 ms.
+_pending_games = queue.Queue()
+_batch_size = 32
+_batch_latency = 0.05
+_writer_lock = threading.Lock()
+_writer = None
+# Called (each on its own thread) when a batch could not be written, see on_write_failure
+_write_failure_callbacks = []
 
-def query_all_data():
+
+def _write_pending_games():
+    """
+    Write the queued games to the database in batches, forever.
+    """
+    while True:
+        batch = [_pending_games.get()]
+        deadline = time.monotonic() + _batch_latency
+        while len(batch) < _batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_pending_games.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        # Try the batch twice; duplicates are skipped, so a retry cannot add a game twice
+        written = False
+        for attempt in range(2):
+            try:
+                with engine.begin() as connection:
+                    connection.execute(_insert_game_statement, batch)
+                written = True
+                break
+            except Exception:
+                logger.exception(
+                    "Failed to write %d games to the database (attempt %d)",
+                    len(batch),
+                    attempt + 1,
+                )
+        for _ in batch:
+            _pending_games.task_done()
+
+        # The callbacks run on their own threads, as they may wait on a caller that is
+        # itself waiting for this thread to write the next batch
+        if not written:
+            for callback in _write_failure_callbacks:
+                threading.Thread(target=callback, daemon=True).start()
+
+
+def on_write_failure(callback):
     """
-    Queries all data from the 'nyt_rankbot' table in the database.
+    Register a function to call when queued games could not be written to the database.
+
+    Args:
+        callback (callable): Called without arguments, e.g. to drop cached scores.
 
     Returns:
-    - data_tuples: A list of tuples containing the fetched data from the database.
+        None
+    """
+    _write_failure_callbacks.append(callback)
+
+
+def queue_game_for_database(user, game, score, today):
     """
-    session = SessionFactory()
-    data = session.query(NytRankbot).all()
-    session.close()
+    Queue game data to be added to the database by the background writer.
+
+    Duplicates (same user, game and date) are skipped when written, so the caller is
+    expected to have checked the submission already.
+
+    Args:
+        user (str): The user's name.
+        game (str): The name of the game.
+        score (str): The score for the game.
+        today (datetime.date): The date for which the data is being added.
+
+    Returns:
+        None
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_pending_games, daemon=True)
+            _writer.start()
+
+    _pending_games.put({"user": user, "game": game, "score": score, "date": today})
 
-    # Extract attributes from instances and create a list of tuples
-    data_tuples = [
-        (item.id, item.user, item.game, item.score, item.date) for item in data
-    ]
+
+@atexit.register
+def flush_pending_games():
+    """
+    Wait until all queued games have been written to the database.
+
+    Returns:
+        None
+    """
+    _pending_games.join()
+
+
+def query_period_totals(start, end):
+    """
+    Queries the total points of each user between two dates, ranking the games in SQL.
+
+    Args:
+        start (datetime.date): The first date of the period.
+        end (datetime.date): The last date of the period.
+
+    Returns:
+    - data_tuples: A list of (user, points) tuples, sorted by points in descending order.
+    """
+    flush_pending_games()
+    with engine.connect() as connection:
+        data = connection.execute(
+            _period_totals_query, {"start": start, "end": end}
+        ).all()
+
+    data_tuples = [(user, points) for user, points in data]
 
     return data_tuples
 
 
-def user_has_submitted(user, game, today):
+def query_today(today):
     """
-    Check if a user has submitted data for a specific game on the current date.
+    Queries the scores submitted on a specific date from the 'nyt_rankbot' table.
+
+    Args:
+        today (datetime.date): The date for which the scores are fetched.
 
     Returns:
-        bool: True if the user has submitted data, False otherwise.
+    - data_tuples: A list of (user, game, score) tuples for the given date, sorted by game and score.
     """
-    session = SessionFactory()
-    submitted = (
-        session.query(NytRankbot).filter_by(user=user, game=game, date=today).first()
-        is not None
-    )
-    session.close()
-    return submitted
+    flush_pending_games()
+    with engine.connect() as connection:
+        data = connection.execute(_today_query, {"date": today}).all()
+
+    data_tuples = [(user, game, score) for user, game, score in data]
+
+    return data_tuples
 
 
 def add_game_to_database(user, game, score, today):
     """
-    Add game data to the database.
+    Add game data to the database, unless the user already submitted the game on that date.
 
     Args:
         user (str): The user's name.
         game (str): The name of the game.
-        score (str): The score for the game.
+        score (int): The score for the game.
         today (datetime.date): The date for which the data is being added.
 
     Returns:
-        None
+        bool: True if the data was added, False if the user had already submitted.
     """
-    new_data = NytRankbot(
-        user=user,
-        game=game,
-        score=score,
-        date=today,
-    )
+    params = {"user": user, "game": game, "score": score, "date": today}
 
-    session = SessionFactory()
-    session.add(new_data)
+    flush_pending_games()
+    with engine.begin() as connection:
+        result = connection.execute(_insert_game_statement, params)
 
-    session.commit()
-    session.close()
+    return result.rowcount == 1
 
 
 def clear_table(today, user=None):
@@ -78,12 +229,9 @@ def clear_table(today, user=None):
     Returns:
         None
     """
-    session = SessionFactory()
-    try:
+    flush_pending_games()
+    with engine.begin() as connection:
         if user:
-            session.query(NytRankbot).filter_by(date=today, user=user).delete()
+            connection.execute(_clear_user_statement, {"date": today, "user": user})
         else:
-            session.query(NytRankbot).filter_by(date=today).delete()
-        session.commit()
-    finally:
-        session.close()
+            connection.execute(_clear_date_statement, {"date": today})
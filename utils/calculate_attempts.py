@@ -1,4 +1,4 @@
-from utils.patterns import mini_pattern, mini_pattern_app, wordle_pattern
+from utils.patterns import connections_row_pattern
 
 
 def connections_attempts(message):
@@ -9,69 +9,55 @@ def connections_attempts(message):
     - message (str): The input message containing Connections game information.
 
     Returns:
-    - int: The number of connection attempts.
+    - int: The number of connection attempts, or None if the message has no rows.
     """
-    connection_colours = "🟨🟩🟦🟪"
-    connections_lines = message.splitlines()
-    connections_lines = [
-        line
-        for line in connections_lines
-        if any(square in line for square in connection_colours)
-    ]
-
-    # Check if the final object is not all the same color square
-    final_object = [
-        square
-        for square in connections_lines[-1]
-        if square in connection_colours  # ignore any text
-    ]
-    if not all(final_object[0] == square for square in final_object):
+    # Stream over the rows, only keeping the count and the final row
+    attempts, final_row = 0, None
+    for final_row in connections_row_pattern.finditer(message):
+        attempts += 1
+
+    if final_row is None:
+        return None
+
+    # Check if the final row is not all the same color square
+    if len(set(final_row.group(0))) > 1:
         return 8
 
-    attempts = len(connections_lines)
     return attempts
 
 
-def mini_time(message):
+def mini_time(match):
     """
-    Extract the amount of time to complete the Mini.
+    Extract the amount of time to complete the Mini, in seconds.
 
-    Parameters:
-    - message (str): The input message containing Mini game information.
-
-    Returns:
-    - str: The extracted time.
-    """
-    time = mini_pattern.search(message).group(1)
-    return time
-
-
-def mini_time_app(message):
-    """
-    Extract the amount of time to complete the Mini, when sent using the app.
+    The time is sent as a number of seconds in a link from the website, or as
+    "minutes:seconds" when sent using the app.
 
     Parameters:
-    - message (str): The input message containing Mini game information.
+    - match (re.Match): The game_pattern match of a Mini message.
 
     Returns:
-    - str: The extracted time.
+    - int: The extracted time.
     """
-    minutes_seconds = mini_pattern_app.search(message).group(1)
+    if match.group("mini_seconds") is not None:
+        return int(match.group("mini_seconds"))
+
+    minutes_seconds = match.group("mini_app_time")
     minutes, seconds = map(int, minutes_seconds.split(":"))
     time = (minutes * 60) + seconds
     return time
 
 
-def wordle_attempts(message):
+def wordle_attempts(match):
     """
     Count the number of attempts to complete Wordle.
 
     Parameters:
-    - message (str): The input message containing Wordle game information.
+    - match (re.Match): The game_pattern match of a Wordle message.
 
     Returns:
     - str: The extracted number of attempts.
     """
-    attempts = wordle_pattern.search(message).group(1)
+    attempts = match.group("wordle_attempts")
     attempts = attempts.replace("X", "7")
     return attempts
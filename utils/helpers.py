@@ -6,100 +6,324 @@ It utilizes a database to store user-submitted scores, calculates rankings, and
 The functionality includes adding new game scores, displaying today's rankings, and clearing the database for a given day.
 """
 
-from datetime import datetime
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import chain
 
-import pandas as pd
-import pytz
 from telegram import Chat, Update, error
 
 from database.queries import (
     add_game_to_database,
     clear_table,
-    query_all_data,
-    user_has_submitted,
+    on_write_failure,
+    query_period_totals,
+    query_today,
+    queue_game_for_database,
 )
 
+logger = logging.getLogger(__name__)
 
-def calculate_rankings():
+# Telegram calls whose response the handler doesn't need are made in the background
+_send_pool = ThreadPoolExecutor(max_workers=4)
+
+# Chat descriptions are set one at a time, so that an older scoreboard never replaces a
+# newer one; the scoreboard version last set per chat is kept to skip stale ones
+_description_pool = ThreadPoolExecutor(max_workers=1)
+_description_versions: dict[int, int] = {}
+
+# The all-submitted check runs on its own pool, so it never waits behind queued sends
+_check_pool = ThreadPoolExecutor(max_workers=4)
+
+# The current game day (UTC) and the timestamp of the next UTC midnight, when it expires
+_game_day = (0.0, None)
+
+# Today's scores per game, sorted ascending by score (lower is better).
+# Loaded once per day and then kept in step with the database by add_game.
+# Handlers run on several worker threads: writers hold the lock, and the per-game
+# lists are replaced rather than mutated, so readers can use a shallow copy.
+_today_scores: dict[str, list[tuple[str, int]]] = {}
+_today_date = None
+_today_lock = threading.Lock()
+
+# Incremented (under the lock above) whenever scores are added or cleared, so that the
+# rendered scoreboard is only rebuilt when something changed
+_scoreboard_version = 0
+_scoreboard_cache = None  # (version, date, message)
+
+# Number of participants per chat, and when it was fetched (time.monotonic())
+_participants_counts: dict[int, tuple[float, int]] = {}
+_participants_ttl = 300
+
+# Each user's points this month before today, and the date they were calculated on
+_earlier_month_totals = (None, [])
+
+
+def send_in_background(send, *args, **kwargs):
     """
-    Calculate and return the rankings based on today's scores.
+    Make a Telegram API call on the send pool, without waiting for its response.
+
+    Parameters:
+    - send (callable): The Telegram API method to call.
+    - *args, **kwargs: The arguments for the call.
 
     Returns:
-    - sorted_df (pd.DataFrame): DataFrame containing sorted scores for each game.
-    - total_points (pd.DataFrame): DataFrame containing total points for each user.
+    - concurrent.futures.Future: The pending call.
+    """
+    future = _send_pool.submit(send, *args, **kwargs)
+    future.add_done_callback(log_send_error)
+    return future
+
+
+def set_description_in_background(bot, chat_id, version, scoreboard_msg):
     """
-    # Query all data from the db
-    data = query_all_data()
+    Set the chat description to a scoreboard on the description pool, without waiting.
 
-    # Create DataFrame from the query result
-    score_df = pd.DataFrame(data, columns=["id", "user", "game", "score", "date"])
+    Parameters:
+    - bot (telegram.Bot): The bot to make the call with.
+    - chat_id (int): The chat to set the description of.
+    - version (int): The scoreboard version the message was built from.
+    - scoreboard_msg (str): The scoreboard message.
 
-    # Calculate rankings per date/game and assign points
-    sorted_df = score_df.sort_values(by=["date", "game", "score"])
-    sorted_df["points"] = sorted_df.groupby(["date", "game"])["score"].rank(
-        method="min"
+    Returns:
+    - concurrent.futures.Future: The pending call.
+    """
+    future = _description_pool.submit(
+        _set_description, bot, chat_id, version, scoreboard_msg
     )
-    point_mapping = {1: 3, 2: 2, 3: 1}
-    sorted_df["points"] = sorted_df["points"].map(point_mapping).fillna(0)
+    future.add_done_callback(log_send_error)
+    return future
+
+
+def _set_description(bot, chat_id, version, scoreboard_msg):
+    """
+    Set the chat description, unless a scoreboard at least as new was already set.
+    Runs on the single description thread, so it needs no lock.
+    """
+    if version <= _description_versions.get(chat_id, -1):
+        return
+    _description_versions[chat_id] = version
+    bot.set_chat_description(chat_id, scoreboard_msg)
+
+
+def log_send_error(future):
+    """
+    Log the error of a failed background Telegram call.
+
+    A BadRequest is expected for some calls (e.g. setting the description of a
+    private chat), so it is only logged at debug level.
+    """
+    exception = future.exception()
+    if isinstance(exception, error.BadRequest):
+        logger.debug("Telegram request rejected: %s", exception)
+    elif exception is not None:
+        logger.error("Telegram request failed", exc_info=exception)
 
-    return sorted_df
 
+def today_date():
+    """
+    Return the current game day in UTC, only recomputing it once the day has rolled over.
 
-def calculate_period_total(sorted_df: pd.DataFrame, today: datetime.date, period: str):
+    Returns:
+    - datetime.date: Today's date in UTC.
     """
-    Calculate total points for each user based on the given sorted DataFrame for a specified period.
+    global _game_day
+    expires, today = _game_day
+    if time.time() >= expires:
+        today = datetime.now(timezone.utc).date()
+        next_midnight = datetime.combine(
+            today + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc
+        )
+        _game_day = (next_midnight.timestamp(), today)
+
+    return today
+
+
+def load_today_scores(today):
+    """
+    Return today's scores per game, reloading them from the database on a new day.
 
     Parameters:
-    - sorted_df (pandas.DataFrame): A DataFrame containing sorted data with a "date" column and a "points" column.
-    - today (datetime.date): The date for which to calculate the total points.
-    - period (str): A string indicating the period for which to calculate totals ('today' or 'month').
+    - today (datetime.date): The current date.
 
     Returns:
-    - period_df (pandas.DataFrame): A subset of the input DataFrame for the specified period.
-    - period_total_df (pandas.DataFrame): A DataFrame with the total points for each user in the specified period, sorted in descending order.
-    """
-    if period == "today":
-        period_df = sorted_df[sorted_df["date"] == today]
-    elif period == "month":
-        start_of_month = datetime(today.year, today.month, 1)
-        end_of_month = datetime(today.year, today.month + 1, 1) - pd.Timedelta(days=1)
-        period_df = sorted_df[
-            (sorted_df["date"] >= start_of_month.date())
-            & (sorted_df["date"] <= end_of_month.date())
-        ]
-    else:
-        raise ValueError("Invalid period. Use 'today' or 'month'.")
+    - tuple: The scoreboard version of the scores, and a mapping of game name to a
+      list of (user, score) tuples, sorted by score.
+    """
+    with _today_lock:
+        return _scoreboard_version, dict(_load_today_scores(today))
+
+
+def _load_today_scores(today):
+    """
+    Reload today's scores from the database on a new day; the caller holds the lock.
+    """
+    global _today_scores, _today_date
+    if _today_date != today:
+        # Rows arrive sorted by game and score, so each game's list is built in order
+        today_scores = {}
+        for user, game, score in query_today(today):
+            today_scores.setdefault(game, []).append((user, int(score)))
+        _today_scores, _today_date = today_scores, today
 
-    period_total_df = period_df.groupby("user")["points"].sum().reset_index()
-    period_total_df = period_total_df.sort_values(by="points", ascending=False)
-    return period_df, period_total_df
+    return _today_scores
+
+
+def submit_today_score(user, game, score, today):
+    """
+    Add a newly submitted score to the cached ranking of its game, and queue it to be
+    written to the database.
+
+    Parameters:
+    - user (str): The username.
+    - game (str): The name of the game.
+    - score (int): The score achieved in the game.
+    - today (datetime.date): The date for which the score is submitted.
+
+    Returns:
+    - bool: True if the score was added, False if the user already submitted the game today.
+    """
+    global _scoreboard_version
+    with _today_lock:
+        game_scores = _load_today_scores(today).get(game, [])
+        if any(name == user for name, _ in game_scores):
+            return False
+
+        _today_scores[game] = sorted(
+            game_scores + [(user, int(score))], key=lambda item: item[1]
+        )
+        # Queued while holding the lock, so that a reload can't miss the score
+        queue_game_for_database(user, game, score, today)
+        _scoreboard_version += 1
+        return True
+
+
+def invalidate_today_scores():
+    """
+    Drop the cached scores so that the next lookup reloads them from the database.
+    """
+    global _today_date, _scoreboard_version
+    with _today_lock:
+        _today_date = None
+        _scoreboard_version += 1
+
+
+# Games that failed to be written are missing from the database, so reload from it
+on_write_failure(invalidate_today_scores)
+
+
+def rank_game(game_scores):
+    """
+    Assign points to a game's scores, where tied scores share the best rank.
+
+    Parameters:
+    - game_scores (list): A list of (user, score) tuples, sorted by score.
+
+    Returns:
+    - list: A list of (user, score, points) tuples in ranking order.
+    """
+    ranked = []
+    rank, previous_score = 0, None
+    for position, (user, score) in enumerate(game_scores, start=1):
+        if score != previous_score:
+            rank, previous_score = position, score
+        # 3, 2 and 1 points for the top three ranks, 0 below
+        ranked.append((user, score, max(4 - rank, 0)))
+
+    return ranked
+
+
+def total_points(user_points):
+    """
+    Sum the points scored by each user.
+
+    Parameters:
+    - user_points (iterable): (user, points) tuples.
+
+    Returns:
+    - list: A list of (user, points) tuples, sorted by points in descending order.
+    """
+    totals = Counter()
+    for user, points in user_points:
+        totals[user] += points
+
+    return totals.most_common()
+
+
+def today_totals(today_scores):
+    """
+    Calculate total points for each user from today's cached scores.
+
+    Parameters:
+    - today_scores (dict): Mapping of game name to a sorted list of (user, score) tuples.
+
+    Returns:
+    - list: A list of (user, points) tuples, sorted by points in descending order.
+    """
+    return total_points(
+        (user, points)
+        for game_scores in today_scores.values()
+        for user, _, points in rank_game(game_scores)
+    )
+
+
+def earlier_month_totals(today: datetime.date):
+    """
+    Calculate total points for each user this month, before today.
+
+    Earlier days can no longer change, so they are only queried once per day, and the
+    games are ranked by the database.
+
+    Parameters:
+    - today (datetime.date): The current date.
+
+    Returns:
+    - list: (user, points) tuples, sorted by points in descending order.
+    """
+    global _earlier_month_totals
+    cached_date, totals = _earlier_month_totals
+    if cached_date != today:
+        start_of_month = today.replace(day=1)
+        totals = query_period_totals(start_of_month, today - timedelta(days=1))
+        _earlier_month_totals = (today, totals)
+
+    return totals
 
 
 def get_participants_count(update: Update, context):
     """
     Get the number of participants in the Telegram chat.
 
+    The count is cached per chat for a few minutes, as fetching it is a round trip
+    to Telegram.
+
     Args:
     - update (telegram.Update): The update object.
     - context (telegram.ext.CallbackContext): The context object.
 
     Returns:
-    - None
+    - int: The number of participants, excluding the bot.
     """
-    chat_id = update.message.chat_id
-    chat = context.bot.get_chat(chat_id)
+    # The message already says which kind of chat it comes from
+    chat = update.message.chat
 
     # Check if the message comes from a group chat
     if chat.type not in (Chat.GROUP, Chat.SUPERGROUP):
-        participants_count = 1
-    else:
+        return 1
+
+    fetched_at, participants_count = _participants_counts.get(chat.id, (None, None))
+    if fetched_at is None or time.monotonic() - fetched_at >= _participants_ttl:
         # Get the number of participants (- 1 for the bot)
-        participants_count = chat.get_members_count() - 1
+        participants_count = context.bot.get_chat_members_count(chat.id) - 1
+        _participants_counts[chat.id] = (time.monotonic(), participants_count)
 
     return participants_count
 
 
-def add_game(user, game, score, context, update: Update):
+def add_game(user, game, score, today, context, update: Update):
     """
     Add a new game score to the database.
     Reports updated daily totals to Telegram if all users have submitted.
@@ -108,37 +332,42 @@ def add_game(user, game, score, context, update: Update):
     - user (str): The username.
     - game (str): The name of the game.
     - score (int): The score achieved in the game.
+    - today (datetime.date): The date for which the score is added.
     - context (telegram.ext.CallbackContext): The context object.
     - update (telegram.Update): The update object.
 
     Returns:
     - None
     """
-    # Check if the user has already submitted a game for today
-    today = datetime.now(pytz.utc).date()
-    if user_has_submitted(user, game, today):
+    # Add the new data to today's ranking and (in the background) to the database,
+    # unless the user already submitted the game today
+    if not submit_today_score(user, game, score, today):
         update.message.reply_text(
             f"{user} has already submitted a score for '{game}' today 🤨!"
         )
         return
 
-    # Add the new data to the database
-    add_game_to_database(user, game, score, today)
+    # Take one snapshot of today's scores for both the scoreboard and the check below
+    today_snapshot = load_today_scores(today)
+    # Start the check, which may ask Telegram for the participant count, on the check
+    # pool so that the round trip overlaps with building the scoreboard
+    all_submitted = _check_pool.submit(
+        check_all_submitted, context, update, today_snapshot[1]
+    )
 
     # Broadcast an updated scoreboard to the description/a message
-    try:
-        chat_id = update.message.chat_id
-        scoreboard_msg = prepare_scoreboard_msg()
-        context.bot.set_chat_description(chat_id, scoreboard_msg)
-    except error.BadRequest:  # can't set private chat description
-        pass
+    chat_id = update.message.chat_id
+    scoreboard_msg = prepare_scoreboard_msg(today, today_snapshot)
+    set_description_in_background(
+        context.bot, chat_id, today_snapshot[0], scoreboard_msg
+    )
     # Broadcast an updated scoreboard to a message if all users submitted
-    if check_all_submitted(context, update, today):
+    if all_submitted.result():
         update.message.reply_text("All users submitted!")
-        show_scoreboard(update, context)
+        send_in_background(update.message.reply_text, scoreboard_msg)
 
 
-def check_all_submitted(context, update: Update, today):
+def check_all_submitted(context, update: Update, today_scores):
     """
     This function checks if:
     (a) scores for 3 unique games have been submitted
@@ -148,21 +377,18 @@ def check_all_submitted(context, update: Update, today):
     Parameters:
     - context: The context object for the Telegram bot.
     - update: The update object representing an incoming message.
-    - today: The specific date for which to check submissions.
+    - today_scores: Today's scores per game, as returned by load_today_scores.
 
     Returns:
-    None
+    bool: True if all participants submitted all games.
     """
+    if len(today_scores) != 3:
+        return False
+
     participants_count = get_participants_count(update, context)
-    sorted_df = calculate_rankings()
-    sorted_df_today = sorted_df[sorted_df["date"] == today]
+    # Users submit a game at most once per day, so each game's list length counts its users
     all_submitted = all(
-        [
-            sorted_df_today["game"].nunique() == 3,
-            (
-                sorted_df_today.groupby("game")["user"].nunique() == participants_count
-            ).all(),
-        ]
+        len(game_scores) == participants_count for game_scores in today_scores.values()
     )
     return all_submitted
 
@@ -178,48 +404,71 @@ def show_scoreboard(update: Update, context):
     Returns:
     - None
     """
-    scoreboard_msg = prepare_scoreboard_msg()
+    scoreboard_msg = prepare_scoreboard_msg(today_date())
     # Send the scoreboard message to Telegram
-    update.message.reply_text(scoreboard_msg)
+    send_in_background(update.message.reply_text, scoreboard_msg)
+
 
+def format_table(rows):
+    """
+    Format rows as a table with right-aligned columns, without a header or index.
+
+    Parameters:
+    - rows (list): A non-empty list of equally long tuples.
 
-def prepare_scoreboard_msg():
+    Returns:
+    str: The formatted table, one row per line.
+    """
+    cells = [[str(value) for value in row] for row in rows]
+    widths = [max(map(len, column)) for column in zip(*cells)]
+    return "\n".join(
+        " ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in cells
+    )
+
+
+def prepare_scoreboard_msg(today, today_snapshot=None):
     """
     Prepare a message for today's scoreboard, including game-specific scores, daily totals, and monthly totals.
 
+    Parameters:
+    - today (datetime.date): The date of the scoreboard.
+    - today_snapshot (tuple, optional): Today's scores, as returned by load_today_scores.
+      Loaded if not provided.
+
     Returns:
     str: Scoreboard message for the day.
     """
-    today = datetime.now(pytz.utc).date()
-    # Calculate new rankings
-    sorted_df = calculate_rankings()
-    # Monthly total
-    monthly_df, monthly_total_df = calculate_period_total(
-        sorted_df, today, period="month"
-    )
-    # Today total
-    today_df, today_total_df = calculate_period_total(sorted_df, today, period="today")
-
-    # Prepare the message for today's scoreboard
-    scoreboard_msg = ""
-    # Iterate through unique games and append to the message
-    for game in sorted_df[sorted_df["date"] == today]["game"].unique():
-        game_today_df = sorted_df[
-            (sorted_df["game"] == game) & (sorted_df["date"] == today)
-        ]
-        game_scoreboard_msg = f"🔢 {game} points 🔢\n{game_today_df[['user', 'score']].to_string(index=False, header=False)}\n\n"
-        scoreboard_msg += game_scoreboard_msg
+    global _scoreboard_cache
+    version, today_scores = today_snapshot or load_today_scores(today)
+    # Reuse the last message if no scores changed since it was built
+    if _scoreboard_cache is not None and _scoreboard_cache[:2] == (version, today):
+        return _scoreboard_cache[2]
+
+    # Today total, from the cached scores
+    today_total = today_totals(today_scores)
+    # Monthly total, adding today to the earlier days of the month
+    monthly_total = total_points(chain(earlier_month_totals(today), today_total))
+
+    # Prepare the message for today's scoreboard, as parts joined once at the end
+    scoreboard_parts = []
+    # Iterate through today's games and append to the message
+    for game in sorted(today_scores):
+        scoreboard_parts.append(
+            f"🔢 {game} points 🔢\n{format_table(today_scores[game])}\n\n"
+        )
     # Append daily totals
-    if len(today_total_df) == 0:
-        scoreboard_msg += "No points scored for today! 😔\n\n"
+    if len(today_total) == 0:
+        scoreboard_parts.append("No points scored for today! 😔\n\n")
     else:
-        scoreboard_msg += f"👑 Daily totals 👑 \n{today_total_df.to_string(index=False, header=False)}\n\n"
+        scoreboard_parts.append(f"👑 Daily totals 👑 \n{format_table(today_total)}\n\n")
     # Append monthly totals
-    if len(monthly_total_df) == 0:
-        scoreboard_msg += "No points scored for this month! 😢"
+    if len(monthly_total) == 0:
+        scoreboard_parts.append("No points scored for this month! 😢")
     else:
-        scoreboard_msg += f"📅 Monthly totals 📅 \n{monthly_total_df.to_string(index=False, header=False)}"
+        scoreboard_parts.append(f"📅 Monthly totals 📅 \n{format_table(monthly_total)}")
+    scoreboard_msg = "".join(scoreboard_parts)
 
+    _scoreboard_cache = (version, today, scoreboard_msg)
     return scoreboard_msg
 
 
@@ -235,11 +484,12 @@ def clear_scoreboard(update: Update, context):
     - None
     """
     # Parse arguments
-    today = datetime.now(pytz.utc).date()
+    today = today_date()
     user = context.args[0] if context.args else None
 
     # Call the function to clear data to the database
     clear_table(today, user)
+    invalidate_today_scores()
 
     # Send a confirmation message
     if user:
@@ -266,10 +516,21 @@ def add_manual_score(update, context):
         update.message.reply_text("Usage: /add <user> <game> <score>")
         return
     user, game, score = context.args
-    today = datetime.now(pytz.utc).date()
+    # Store the score as a number, since the cached ranking reads it back with int()
+    try:
+        score = int(score)
+    except ValueError:
+        update.message.reply_text("Usage: /add <user> <game> <score>")
+        return
+    today = today_date()
 
     # Call the function to add data to the database
-    add_game_to_database(user, game, score, today)
+    if not add_game_to_database(user, game, score, today):
+        update.message.reply_text(
+            f"{user} has already submitted a score for '{game}' today 🤨!"
+        )
+        return
+    invalidate_today_scores()
 
     # Send a confirmation message
     update.message.reply_text(f"Score added for {user} in {game}: {score}")
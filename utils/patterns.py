@@ -6,8 +6,16 @@ This module defines regular expression patterns for extracting score info.
 
 import re
 
-connections_pattern = re.compile(r"Connections.*\nPuzzle #[0-9]+")
-mini_pattern = re.compile(r"badges\/games\/mini.+t=([0-9]+)")
-# Mini scores are sent differently if using the app
-mini_pattern_app = re.compile(r"I solved the .* New York Times Mini Crossword in (.+)!")
-wordle_pattern = re.compile(r"Wordle.+(.)/[0-9]")
+# All games in a single pattern, so that a message is only scanned once; the name of
+# the matching group tells which game the message is for, and the nested groups hold
+# the score info. Mini scores are sent differently if using the app.
+game_pattern = re.compile(
+    r"(?P<connections>Connections.*\nPuzzle #[0-9]+)"
+    r"|(?P<mini>badges\/games\/mini.+t=(?P<mini_seconds>[0-9]+))"
+    r"|(?P<mini_app>I solved the .* New York Times Mini Crossword in (?P<mini_app_time>.+)!)"
+    r"|(?P<wordle>Wordle.+(?P<wordle_attempts>.)/[0-9])"
+)
+# Fixed text found in every message matching game_pattern, to cheaply skip other messages
+game_keywords = ("Connections", "badges/games/mini", "Mini Crossword", "Wordle")
+# A row of four coloured squares, one per Connections attempt
+connections_row_pattern = re.compile(r"[🟨🟩🟦🟪]{4}")